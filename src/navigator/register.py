@@ -1,21 +1,36 @@
 import logging
 import httpx
 import re
-import json
+import orjson
+import pyjson5
 import os
+import signal
 import asyncio
+import ast
 import traceback
-import subprocess
-
-# Fix for macOS: ensure child watcher is set for asyncio subprocess support
+import hashlib
+import time
+import weakref
+import concurrent.futures
+from collections import OrderedDict
+from typing import Any
+from urllib.parse import urljoin, urldefrag, urlsplit
+
+# Prefer uvloop's libuv-based event loop; it supports subprocesses natively, so no child watcher is needed
 import sys
-if sys.platform == "darwin":
-    asyncio.set_event_loop_policy(asyncio.DefaultEventLoopPolicy())
-    try:
-        asyncio.get_event_loop()._child_watcher = asyncio.SafeChildWatcher()
-    except Exception:
-        pass
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    # Fix for macOS: ensure child watcher is set for asyncio subprocess support
+    if sys.platform == "darwin":
+        asyncio.set_event_loop_policy(asyncio.DefaultEventLoopPolicy())
+        try:
+            asyncio.get_event_loop()._child_watcher = asyncio.SafeChildWatcher()
+        except Exception:
+            pass
 
+from selectolax.lexbor import LexborHTMLParser
 from aiq.builder.builder import Builder
 from aiq.builder.function_info import FunctionInfo
 from aiq.data_models.function import FunctionBaseConfig
@@ -24,9 +39,284 @@ from aiq.builder.framework_enum import LLMFrameworkEnum
 
 logger = logging.getLogger(__name__)
 
+_SLUG_RE = re.compile(r'[^a-zA-Z0-9]+')
+_URL_RE = re.compile(r'https?://\S+')
+_FAILING_RE = re.compile(rb'failing', re.IGNORECASE)
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+_RUNNING_RE = re.compile(r'^\s*Running:\s+(\S+)[^\n]*$', re.MULTILINE)
+_SECTION_FAILED_RE = re.compile(r'\b[1-9]\d* failing\b|Failing:\s+[1-9]')
+_FILE_MARKER_RE = re.compile(r'^-----FILE: (.+?)-----[ \t]*$', re.MULTILINE)
+
+def _slugify(text: str) -> str:
+    return _SLUG_RE.sub('_', text).strip('_').lower()
+
+def _nonempty_lines(text: str) -> list[str]:
+    return [line for line in map(str.strip, text.splitlines()) if line]
+
+def _dumps(obj) -> str:
+    return orjson.dumps(obj).decode()
+
+_loads = orjson.loads
+
+def _parse_loose(text: str):
+    """
+    Parses tool input that should be JSON but may be JSON5 (e.g. single-quoted strings,
+    trailing commas) or a Python literal as produced by the agent.
+    Raises ValueError if none of them parses.
+    """
+    try:
+        return _loads(text)
+    except orjson.JSONDecodeError:
+        pass
+    try:
+        return pyjson5.loads(text)
+    except pyjson5.Json5Exception:
+        pass
+    try:
+        # Last resort for Python reprs using True/False/None
+        return ast.literal_eval(text)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError) as e:
+        raise ValueError(f"Unable to parse input: {e}") from e
+
+def _extract_braced(text: str) -> str | None:
+    """
+    Returns the first balanced {...} block in the text, skipping braces inside quoted strings,
+    or None if there is none.
+    """
+    start = text.find('{')
+    if start < 0:
+        return None
+    depth = 0
+    quote = None
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in ('"', "'"):
+            quote = char
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+# Shared HTTP client so connections (and TLS sessions) are pooled across web_navigator calls
+_HTTP_CLIENT: httpx.AsyncClient | None = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.is_closed:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=64, max_connections=256),
+            timeout=httpx.Timeout(15.0, connect=5.0),
+            headers={"User-Agent": "virtual-qa-automation-engineer/navigator"}
+        )
+    return _HTTP_CLIENT
+
+_SKIPPED_LINK_PREFIXES = ('#', 'javascript:', 'mailto:', 'tel:')
+_NAVIGATION_TAGS = frozenset({'nav', 'footer'})
+_INTERACTIVE_SELECTOR = 'form, button, input, select, textarea'
+_MAX_INTERACTIVE_HTML = 8000
+
+def _has_ancestor(node, tags) -> bool:
+    parent = node.parent
+    while parent is not None:
+        if parent.tag in tags:
+            return True
+        parent = parent.parent
+    return False
+
+def _extract_links(tree: LexborHTMLParser, base_url: str, limit: int) -> list[str]:
+    """
+    Returns up to `limit` absolute, de-duplicated URLs on the same host as the page, skipping
+    fragment, script, mail and phone links. Links inside navigation and footer sections are
+    left out unless the page has no other links.
+    """
+    host = urlsplit(base_url).hostname
+    content_links = []
+    navigation_links = []
+    for node in tree.css('a[href]'):
+        href = (node.attributes.get('href') or '').strip()
+        if not href or href.lower().startswith(_SKIPPED_LINK_PREFIXES):
+            continue
+        url = urldefrag(urljoin(base_url, href)).url
+        if not url.startswith(('http://', 'https://')) or urlsplit(url).hostname != host:
+            continue  # Off-site links (social media, ads, CDNs) are not part of the site under test
+        if _has_ancestor(node, _NAVIGATION_TAGS):
+            navigation_links.append(url)
+        else:
+            content_links.append(url)
+    return list(dict.fromkeys(content_links or navigation_links))[:limit]
+
+def _extract_interactive_html(tree: LexborHTMLParser, limit: int = _MAX_INTERACTIVE_HTML) -> str:
+    """
+    Returns the markup of the page's forms and stand-alone form controls, bounded to `limit`
+    characters. Falls back to the page body without scripts and styles when there are none.
+    """
+    parts = []
+    size = 0
+    for node in tree.css(_INTERACTIVE_SELECTOR):
+        if node.tag != 'form' and _has_ancestor(node, ('form',)):
+            continue  # Already included with its form
+        snippet = node.html
+        parts.append(snippet)
+        size += len(snippet) + 1
+        if size >= limit:
+            break
+    if not parts:
+        tree.strip_tags(['script', 'style', 'noscript', 'svg'])
+        body = tree.body or tree.root
+        return (body.html or '')[:limit] if body is not None else ''
+    return '\n'.join(parts)[:limit]
+
+# Static prompt instructions. They are sent as the leading system message so that the
+# identical prefix can be served from the provider's prompt cache; only the tail varies per call.
+_TEST_SYSTEM = """As a QA engineer, analyze the HTML content provided by the user and generate high-quality test cases focusing on functional testing and user interactions.
+
+Generate test cases that cover:
+
+1. Core Functionality
+- Critical user flows and main features
+- Data validation and error handling
+- State management and persistence
+- Form submissions and data processing
+
+2. User Interface
+- Interactive elements (forms, buttons, links)
+- Input validation and constraints
+- Dynamic content and updates
+- User input handling
+
+For each test case, provide a brief description of what to test.
+Format your response as a list of test case descriptions, one per line.
+
+Only generate test cases for elements and functionality that are actually present in the HTML content."""
+
+_CYPRESS_SYSTEM = """You are an expert QA automation engineer. Write a Cypress JS test script for the test case given by the user, starting from the given URL.
+
+Requirements:
+- Use Cypress best practices.
+- Add comments to explain each step.
+- Only output valid Cypress JS code (no markdown, no explanations).
+- Use the HTML content provided by the user to help you write the test script."""
+
+_CYPRESS_BATCH_SYSTEM = """You are an expert QA automation engineer. Write one Cypress JS test script for each test case given by the user, starting from the URL given for that test case.
+
+Each test case is introduced by a line of the form -----FILE: <file name>-----.
+Output every script preceded by the same -----FILE: <file name>----- line, in the same order, and nothing else.
+
+Requirements:
+- Use Cypress best practices.
+- Add comments to explain each step.
+- Only output valid Cypress JS code after each file line (no markdown, no explanations).
+- Use the HTML content provided for each test case to help you write its test script."""
+
+# LangChain LLM clients shared by all tools of a workflow, per workflow builder and LLM name.
+# Each entry carries its own lock so concurrent first lookups build a client only once.
+_LLM_CACHE: weakref.WeakKeyDictionary[Any, tuple[asyncio.Lock, dict[tuple[str, LLMFrameworkEnum], Any]]] = weakref.WeakKeyDictionary()
+
+async def _get_llm(builder: Builder, llm_name: str):
+    """
+    Returns the LangChain client for the LLM, building it through the builder only the first
+    time it is requested within a workflow.
+    """
+    # Tools receive a per-function child builder; share clients across the workflow builder behind it.
+    # aiq has no public accessor for it, so sharing degrades to one client per tool if it goes away.
+    workflow_builder = getattr(builder, "_workflow_builder", None)
+    if workflow_builder is None:
+        logger.warning(f"{type(builder).__name__} does not expose its workflow builder; "
+                       f"LLM '{llm_name}' will not be shared with other tools")
+        workflow_builder = builder
+
+    entry = _LLM_CACHE.get(workflow_builder)
+    if entry is None:
+        entry = _LLM_CACHE[workflow_builder] = (asyncio.Lock(), {})
+    lock, clients = entry
+
+    key = (llm_name, LLMFrameworkEnum.LANGCHAIN)
+    async with lock:
+        if key not in clients:
+            clients[key] = await builder.get_llm(llm_name, wrapper_type=LLMFrameworkEnum.LANGCHAIN)
+            return clients[key]
+
+    # Record the dependency that builder.get_llm would have recorded for this function
+    dependencies = getattr(builder, "dependencies", None)
+    if dependencies is not None:
+        dependencies.add_llm(llm_name)
+    return clients[key]
+
+# Bounded pool for LLM clients without native async support, so blocking calls neither
+# run on the event loop nor compete with other work on the default executor
+_LLM_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix='llm')
+
+def _supports_native_async(llm) -> bool:
+    from langchain_core.language_models import BaseChatModel
+
+    if not hasattr(llm, "ainvoke"):
+        return False
+    if isinstance(llm, BaseChatModel):
+        # The base implementation of _agenerate only runs the sync call on the default executor
+        return type(llm)._agenerate is not BaseChatModel._agenerate
+    return True
+
+# Bounded LRU of LLM responses keyed by a digest of the model and prompt
+_LLM_RESPONSE_CACHE: OrderedDict[bytes, str] = OrderedDict()
+_LLM_RESPONSE_CACHE_SIZE = 1024
+
+async def _cached_invoke(llm, prompt: str, system: str | None = None) -> str:
+    """
+    Invokes the LLM with the prompt as a human message, preceded by the static system
+    instructions if given, and returns the response content.
+    Identical prompts sent to the same model are answered from an in-memory cache.
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{type(llm).__qualname__}:{getattr(llm, 'model_name', '')}\0".encode())
+    if system is not None:
+        digest.update(system.encode())
+    digest.update(b"\0")
+    digest.update(prompt.encode())
+    key = digest.digest()
+
+    content = _LLM_RESPONSE_CACHE.get(key)
+    if content is not None:
+        _LLM_RESPONSE_CACHE.move_to_end(key)
+        return content
+
+    messages = [HumanMessage(content=prompt)]
+    if system is not None:
+        messages.insert(0, SystemMessage(content=system))
+    if _supports_native_async(llm):
+        response = await llm.ainvoke(messages)
+    else:
+        response = await asyncio.get_running_loop().run_in_executor(_LLM_EXECUTOR, llm.invoke, messages)
+    content = response.content
+    _LLM_RESPONSE_CACHE[key] = content
+    if len(_LLM_RESPONSE_CACHE) > _LLM_RESPONSE_CACHE_SIZE:
+        _LLM_RESPONSE_CACHE.popitem(last=False)
+    return content
+
+# Results of analyze_webpage keyed by a digest of the LLM name and URL, so revisiting
+# a page skips both the fetch and the LLM call
+_ANALYZE_CACHE: OrderedDict[bytes, tuple[float, str]] = OrderedDict()
+_ANALYZE_CACHE_SIZE = 512
+
 class WebNavigatorToolConfig(FunctionBaseConfig, name="web_navigator"):
     description: str
     llm_name: str = "openai_llm"  # Default to OpenAI LLM
+    max_html_bytes: int = 262144  # Stop downloading a page after this many bytes
+    max_links: int = 50  # Maximum number of same-site links returned per page
+    analysis_cache_ttl: float = 3600.0  # Seconds a page analysis is reused, 0 to disable
 
 @register_function(config_type=WebNavigatorToolConfig, framework_wrappers=[LLMFrameworkEnum.LANGCHAIN])
 async def web_navigator_tool(config: WebNavigatorToolConfig, builder: Builder):
@@ -36,7 +326,10 @@ async def web_navigator_tool(config: WebNavigatorToolConfig, builder: Builder):
     - tests: list of test case descriptions
     The URL should be provided directly in the query.
     """
-    from langchain_core.messages import HumanMessage
+
+    llm = await _get_llm(builder, config.llm_name)
+    if not llm:
+        raise RuntimeError(f"Unable to access LLM '{config.llm_name}' for content analysis")
 
     async def analyze_webpage(query: str) -> str:
         try:
@@ -44,80 +337,47 @@ async def web_navigator_tool(config: WebNavigatorToolConfig, builder: Builder):
             if isinstance(query, str):
                 try:
                     # Clean the input string to extract just the JSON part
-                    if '{' in query and '}' in query:
-                        json_part = query[query.find('{'):query.find('}')+1]
-                        data = json.loads(json_part.replace("'", '"'))
-                        if isinstance(data, dict) and 'query' in data:
-                            query = data['query']
-                    else:
-                        # Try standard JSON parsing
-                        query_clean = query.strip().replace("'", '"')
-                        data = json.loads(query_clean)
-                        if isinstance(data, dict) and 'query' in data:
-                            query = data['query']
-                except json.JSONDecodeError:
+                    json_part = _extract_braced(query)
+                    data = _parse_loose(json_part if json_part is not None else query.strip())
+                    if isinstance(data, dict) and 'query' in data:
+                        query = data['query']
+                except ValueError:
                     # Extract URL if JSON parsing fails
-                    url_match = re.search(r'https?://\S+', query)
+                    url_match = _URL_RE.search(query)
                     if url_match:
                         query = url_match.group(0)
                     # Otherwise use query as is
 
             url = query.strip()
             if not url.startswith(('http://', 'https://')):
-                return json.dumps({"error": "Please provide a valid URL starting with http:// or https://"})
+                return _dumps({"error": "Please provide a valid URL starting with http:// or https://"})
+
+            cache_key = hashlib.blake2b(f"{config.llm_name}\0{url}".encode(), digest_size=16).digest()
+            cached = _ANALYZE_CACHE.get(cache_key)
+            if cached is not None and time.monotonic() - cached[0] < config.analysis_cache_ttl:
+                _ANALYZE_CACHE.move_to_end(cache_key)
+                logger.info(f"Reusing cached analysis for {url}")
+                return cached[1]
             
-            # Fetch HTML content
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url)
+            # Fetch HTML content, reading no more of the body than will be analyzed
+            async with _get_http_client().stream('GET', url) as response:
                 response.raise_for_status()
-                html_content = response.text
+                buffer = bytearray()
+                async for chunk in response.aiter_bytes():
+                    buffer.extend(chunk)
+                    if len(buffer) >= config.max_html_bytes:
+                        break
+            html_content = buffer[:config.max_html_bytes].decode(response.encoding or 'utf-8', errors='replace')
             logger.info(f"Fetched HTML content from {url}")
             
-            # Get the LLM for analysis
-            llm = await builder.get_llm(config.llm_name, wrapper_type=LLMFrameworkEnum.LANGCHAIN)
-            if not llm:
-                return json.dumps({"error": "Unable to access LLM for content analysis"})
-            
-            # Extract URLs using LLM
-            url_prompt = f"""Extract all important links from the following HTML content. 
-            Focus only on links that represent important child pages or relevant content (not navigation, footer, or utility links).
-            Format your response as a simple list of URLs, one per line.
-            
-            HTML Content:
-            {html_content[:15000]}  # Limit content length to avoid token limits
-            """
-            
-            url_response = llm.invoke([HumanMessage(content=url_prompt)])
-            urls = [url.strip() for url in url_response.content.split('\n') if url.strip()]
-            
-            # Generate test cases using LLM
-            test_prompt = f"""As a QA engineer, analyze the following HTML content and generate high-quality test cases focusing on functional testing and user interactions.
-
-            HTML Content:
-            {html_content[:15000]}  # Limit content length to avoid token limits
-
-            Generate test cases that cover:
-
-            1. Core Functionality
-            - Critical user flows and main features
-            - Data validation and error handling
-            - State management and persistence
-            - Form submissions and data processing
-
-            2. User Interface
-            - Interactive elements (forms, buttons, links)
-            - Input validation and constraints
-            - Dynamic content and updates
-            - User input handling
-
-            For each test case, provide a brief description of what to test.
-            Format your response as a list of test case descriptions, one per line.
-
-            Only generate test cases for elements and functionality that are actually present in the HTML content.
-            """
-            
-            test_response = llm.invoke([HumanMessage(content=test_prompt)])
-            tests = [test.strip() for test in test_response.content.split('\n') if test.strip()]
+            # Extract URLs directly from the parsed anchors
+            tree = LexborHTMLParser(html_content)
+            urls = _extract_links(tree, str(response.url), config.max_links)
+
+            # Generate test cases using LLM, sending only the interactive elements of the page
+            test_prompt = f"HTML Content:\n{_extract_interactive_html(tree)}"
+            test_response = await _cached_invoke(llm, test_prompt, system=_TEST_SYSTEM)
+            tests = _nonempty_lines(test_response)
             
             # Return structured JSON response
             result = {
@@ -125,21 +385,137 @@ async def web_navigator_tool(config: WebNavigatorToolConfig, builder: Builder):
                 "tests": tests
             }
             
-            return json.dumps(result)
+            result_json = _dumps(result)
+            if config.analysis_cache_ttl > 0:
+                _ANALYZE_CACHE[cache_key] = (time.monotonic(), result_json)
+                _ANALYZE_CACHE.move_to_end(cache_key)
+                if len(_ANALYZE_CACHE) > _ANALYZE_CACHE_SIZE:
+                    _ANALYZE_CACHE.popitem(last=False)
+            return result_json
             
         except Exception as e:
             error_message = str(e)
             logger.error(f"Failed to process query: {error_message}")
-            return json.dumps({"error": error_message})
+            return _dumps({"error": error_message})
 
-    yield FunctionInfo.from_fn(
-        analyze_webpage,
-        description="Fetches and analyzes a webpage, returning structured data with relevant URLs and test case descriptions."
+    try:
+        yield FunctionInfo.from_fn(
+            analyze_webpage,
+            description="Fetches and analyzes a webpage, returning structured data with relevant URLs and test case descriptions."
+        )
+    finally:
+        if _HTTP_CLIENT is not None:
+            await _HTTP_CLIENT.aclose()
+
+# Output folder for generated files, resolved and created once at import
+_OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'output'))
+os.makedirs(_OUTPUT_DIR, exist_ok=True)
+
+def _write_text(file_path: str, content: str) -> None:
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+async def _run_cypress(spec: str, timeout: float) -> tuple[bytes, bytes, bool]:
+    """
+    Runs `npx cypress run` for the given spec without blocking the event loop.
+    Returns the raw stdout and stderr of the run, and whether it was killed for exceeding the timeout.
+    """
+    # Run in its own session so a timeout can kill the node/Cypress processes npx starts, not just npx
+    proc = await asyncio.create_subprocess_exec(
+        'npx', 'cypress', 'run', '--spec', spec,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
     )
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        logger.warning(f"Cypress run for {spec} timed out after {timeout} seconds")
+        return b'', f"Cypress run timed out after {timeout} seconds".encode(), True
+    return out, err, False
+
+def _cypress_failed(out: bytes, err: bytes) -> bool:
+    # Scan the raw output directly instead of decoding and lowercasing a copy of it
+    return _FAILING_RE.search(out) is not None or _FAILING_RE.search(err) is not None
+
+def _cypress_output(out: bytes, err: bytes) -> str:
+    return out.decode(errors='replace') + '\n' + err.decode(errors='replace')
+
+def _cypress_prompt(test_case: str, start_page_url: str, relevant_html_content_to_test) -> str:
+    return (
+        f"Start Page URL: {start_page_url}\n"
+        f"Test Case Description: {test_case}\n\n"
+        f"HTML Content:\n{relevant_html_content_to_test}"
+    )
+
+def _strip_code_fence(text: str) -> str:
+    # Drop a leading ```lang line and a trailing ``` line the model may wrap code in
+    lines = text.strip().splitlines()
+    if lines and lines[0].lstrip().startswith('```'):
+        lines = lines[1:]
+    if lines and lines[-1].strip() == '```':
+        lines = lines[:-1]
+    return '\n'.join(lines).strip()
+
+def _split_files(text: str) -> dict[str, str]:
+    """
+    Splits an LLM response made of `-----FILE: <name>-----` sections into a mapping of
+    file name to file content, without any code fences around the response or each file.
+    """
+    parts = _FILE_MARKER_RE.split(text)
+    return {name.strip(): _strip_code_fence(body) for name, body in zip(parts[1::2], parts[2::2])}
+
+def _failed_specs(cypress_output: str, filenames: list[str]) -> tuple[list[str], bool]:
+    """
+    Attributes failures to specs using the `Running: <spec>` section Cypress prints for each spec.
+    Returns the failed spec file names, and whether some failure could not be tied to one of them.
+    """
+    output = _ANSI_RE.sub('', cypress_output)
+    headers = list(_RUNNING_RE.finditer(output))
+    failed = []
+    unattributed = False
+    for index, header in enumerate(headers):
+        end = headers[index + 1].start() if index + 1 < len(headers) else len(output)
+        section = output[header.end():end]
+        if not _SECTION_FAILED_RE.search(section):
+            continue
+        # Long spec paths are wrapped onto the following lines, up to the first blank line
+        spec_path = header.group(1).strip() + ''.join(line.strip() for line in section.split('\n\n', 1)[0].splitlines())
+        name = os.path.basename(spec_path)
+        if name in filenames and name not in failed:
+            failed.append(name)
+        else:
+            unattributed = True
+    if not failed:
+        unattributed = True
+    return failed, unattributed
+
+async def _fix_cypress_code(llm, code: str, cypress_output: str) -> str:
+    fix_prompt = f"""
+    The following Cypress test code failed when executed. Here is the code:
+    ----
+    {code}
+    ----
+    And here is the output from running the test:
+    ----
+    {cypress_output}
+    ----
+    Please fix the Cypress test code so that it addresses the failure(s). Only output the corrected Cypress JS code (no markdown, no explanations).
+    """
+    return (await _cached_invoke(llm, fix_prompt)).strip()
 
 class GenerateTestAutomationCodeConfig(FunctionBaseConfig, name="generate_test_automation_code"):
     description: str
     llm_name: str = "openai_llm"  # Default to OpenAI LLM
+    cypress_timeout: float = 300.0  # Seconds before a Cypress run is killed
 
 @register_function(config_type=GenerateTestAutomationCodeConfig, framework_wrappers=[LLMFrameworkEnum.LANGCHAIN])
 async def generate_test_automation_code_tool(config: GenerateTestAutomationCodeConfig, builder: Builder):
@@ -148,108 +524,291 @@ async def generate_test_automation_code_tool(config: GenerateTestAutomationCodeC
     Input: test_case (str), start_page_url (str), relevant_html_content_to_test (str)
     Output: Cypress JS code as a string
     """
-    from langchain_core.messages import HumanMessage
+
+    llm = await _get_llm(builder, config.llm_name)
+    if not llm:
+        raise RuntimeError(f"Unable to access LLM '{config.llm_name}' for code generation")
 
     async def generate_test_automation_code(query: str) -> str:
         try:
             # Expecting input as JSON: {"test_case": ..., "start_page_url": ...}
             if isinstance(query, str):
                 try:
-                    data = json.loads(query.replace("'", '"'))
+                    data = _parse_loose(query)
                     # If 'query' is present, parse its value as JSON
                     if 'query' in data:
                         inner_query = data['query']
                         if isinstance(inner_query, str):
-                            data = json.loads(inner_query.replace("'", '"'))
+                            data = _parse_loose(inner_query)
                     test_case = data.get("test_case")
                     start_page_url = data.get("start_page_url")
                     relevant_html_content_to_test = data.get("relevant_html_content_to_test")
                 except Exception:
-                    return json.dumps({"error": "Input must be a JSON string with 'test_case', 'start_page_url', and optionally 'relevant_html_content_to_test' fields, or a 'query' key containing such a JSON string."})
+                    return _dumps({"error": "Input must be a JSON string with 'test_case', 'start_page_url', and optionally 'relevant_html_content_to_test' fields, or a 'query' key containing such a JSON string."})
             else:
-                return json.dumps({"error": "Input must be a JSON string."})
+                return _dumps({"error": "Input must be a JSON string."})
 
             if not test_case or not start_page_url:
-                return json.dumps({"error": "Both 'test_case' and 'start_page_url' must be provided."})
-
-            llm = await builder.get_llm(config.llm_name, wrapper_type=LLMFrameworkEnum.LANGCHAIN)
-            if not llm:
-                return json.dumps({"error": "Unable to access LLM for code generation."})
-
-            prompt = f"""
-            You are an expert QA automation engineer. Write a Cypress JS test script for the following test case, starting from the given URL.
+                return _dumps({"error": "Both 'test_case' and 'start_page_url' must be provided."})
 
-            Start Page URL: {start_page_url}
-            Test Case Description: {test_case}
-
-            Requirements:
-            - Use Cypress best practices.
-            - Add comments to explain each step.
-            - Only output valid Cypress JS code (no markdown, no explanations).
-            - Use the following HTML content to help you write the test script:
-            {relevant_html_content_to_test}
-            """
-            response = llm.invoke([HumanMessage(content=prompt)])
-            code = response.content.strip()
+            prompt = _cypress_prompt(test_case, start_page_url, relevant_html_content_to_test)
+            code = (await _cached_invoke(llm, prompt, system=_CYPRESS_SYSTEM)).strip()
 
             # Save code to output folder
-            output_dir = os.path.join(os.path.dirname(__file__), '../../output')
-            os.makedirs(output_dir, exist_ok=True)
-            # Slugify test_case for filename
-            def slugify(text):
-                text = re.sub(r'[^a-zA-Z0-9]+', '_', text)
-                return text.strip('_').lower()
-            filename = f"{slugify(test_case)[:40]}.cy.js"
-            file_path = os.path.abspath(os.path.join(output_dir, filename))
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(code)
+            filename = f"{_slugify(test_case)[:40]}.cy.js"
+            file_path = os.path.join(_OUTPUT_DIR, filename)
+            await asyncio.to_thread(_write_text, file_path, code)
 
             # Run Cypress test and capture output
-            result = subprocess.run(
-                ['npx', 'cypress', 'run', '--spec', file_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            cypress_output = result.stdout.decode() + '\n' + result.stderr.decode()
+            out, err, timed_out = await _run_cypress(file_path, config.cypress_timeout)
+            if timed_out:
+                return _dumps({
+                    "result": f"1 test case generated, but the Cypress run timed out after {config.cypress_timeout} seconds and the test was not verified",
+                    "test_file_path": file_path,
+                    "cypress_timed_out": True
+                })
 
             # If test is failing, ask LLM to fix the code
-            if "failing" in cypress_output.lower():
-                fix_prompt = f"""
-                The following Cypress test code failed when executed. Here is the code:
-                ----
-                {code}
-                ----
-                And here is the output from running the test:
-                ----
-                {cypress_output}
-                ----
-                Please fix the Cypress test code so that it addresses the failure(s). Only output the corrected Cypress JS code (no markdown, no explanations).
-                """
-                fix_response = llm.invoke([HumanMessage(content=fix_prompt)])
-                fixed_code = fix_response.content.strip()
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(fixed_code)
+            if _cypress_failed(out, err):
+                cypress_output = _cypress_output(out, err)
+                fixed_code = await _fix_cypress_code(llm, code, cypress_output)
+                await asyncio.to_thread(_write_text, file_path, fixed_code)
                 code = fixed_code  # update for return
 
-            # return json.dumps({
+            # return _dumps({
             #     "cypress_code": code,
             #     "file_path": file_path,
             #     "cypress_output": cypress_output
             # })
-            return json.dumps({
+            return _dumps({
                 "result": "1 test case generated", 
                 "test_file_path": file_path
                 })
         except Exception as e:
             tb = traceback.format_exc()
             logger.error(f"Failed to generate Cypress code: {e}\n{tb}")
-            return json.dumps({"error": f"{type(e).__name__}: {str(e)}", "traceback": tb})
+            return _dumps({"error": f"{type(e).__name__}: {str(e)}", "traceback": tb})
 
     yield FunctionInfo.from_fn(
         generate_test_automation_code,
         description="Generates Cypress JS test automation code for a given test case and start page URL. Input: JSON with 'test_case' and 'start_page_url'. Output: Cypress JS code as a string."
     )
 
+class GenerateTestAutomationCodeBatchConfig(FunctionBaseConfig, name="generate_test_automation_code_batch"):
+    description: str
+    llm_name: str = "openai_llm"  # Default to OpenAI LLM
+    cypress_timeout: float = 600.0  # Seconds before the Cypress run is killed
+    batch_test_case_generation: bool = True  # Generate all scripts with a single LLM call
+
+@register_function(config_type=GenerateTestAutomationCodeBatchConfig, framework_wrappers=[LLMFrameworkEnum.LANGCHAIN])
+async def generate_test_automation_code_batch_tool(config: GenerateTestAutomationCodeBatchConfig, builder: Builder):
+    """
+    Generates Cypress JS test automation code for several test cases at once and runs
+    all of the generated specs with a single Cypress invocation.
+    Input: test_cases (list of objects with test_case, start_page_url, relevant_html_content_to_test)
+    Output: Paths to the generated Cypress test files
+    """
+
+    llm = await _get_llm(builder, config.llm_name)
+    if not llm:
+        raise RuntimeError(f"Unable to access LLM '{config.llm_name}' for code generation")
+
+    async def generate_test_automation_code_batch(query: str) -> str:
+        try:
+            # Expecting input as JSON: {"test_cases": [{"test_case": ..., "start_page_url": ...}, ...]}
+            if isinstance(query, str):
+                try:
+                    data = _parse_loose(query)
+                    # If 'query' is present, parse its value as JSON
+                    if 'query' in data:
+                        inner_query = data['query']
+                        data = _parse_loose(inner_query) if isinstance(inner_query, str) else inner_query
+                    test_cases = data.get("test_cases")
+                except Exception:
+                    return _dumps({"error": "Input must be a JSON string with a 'test_cases' list of objects with 'test_case', 'start_page_url', and optionally 'relevant_html_content_to_test' fields, or a 'query' key containing such a JSON string."})
+            else:
+                return _dumps({"error": "Input must be a JSON string."})
+
+            if not test_cases or not isinstance(test_cases, list):
+                return _dumps({"error": "'test_cases' must be a non-empty list."})
+            if not all(isinstance(item, dict) and item.get("test_case") and item.get("start_page_url") for item in test_cases):
+                return _dumps({"error": "Every test case must provide both 'test_case' and 'start_page_url'."})
+
+            # Assign a unique spec file name to each test case
+            filenames = []
+            for item in test_cases:
+                stem = _slugify(item["test_case"])[:40]
+                filename = f"{stem}.cy.js"
+                suffix = 2
+                while filename in filenames:
+                    filename = f"{stem}_{suffix}.cy.js"
+                    suffix += 1
+                filenames.append(filename)
+
+            prompts = {
+                filename: _cypress_prompt(item["test_case"], item["start_page_url"], item.get("relevant_html_content_to_test"))
+                for filename, item in zip(filenames, test_cases)
+            }
+
+            codes = {}
+            if config.batch_test_case_generation:
+                batch_prompt = "\n\n".join(f"-----FILE: {filename}-----\n{prompt}" for filename, prompt in prompts.items())
+                codes = _split_files(await _cached_invoke(llm, batch_prompt, system=_CYPRESS_BATCH_SYSTEM))
+
+            # Generate any script missing from the batch response individually
+            missing = [filename for filename in filenames if not codes.get(filename)]
+            if missing:
+                responses = await asyncio.gather(*(_cached_invoke(llm, prompts[filename], system=_CYPRESS_SYSTEM) for filename in missing))
+                codes.update((filename, response.strip()) for filename, response in zip(missing, responses))
+
+            # Save code to output folder
+            file_paths = {filename: os.path.join(_OUTPUT_DIR, filename) for filename in filenames}
+            await asyncio.gather(*(asyncio.to_thread(_write_text, file_paths[filename], codes[filename]) for filename in filenames))
+
+            # Run all Cypress tests at once and capture output
+            out, err, timed_out = await _run_cypress(','.join(file_paths.values()), config.cypress_timeout)
+            if timed_out:
+                return _dumps({
+                    "result": f"{len(filenames)} test cases generated, but the Cypress run timed out after {config.cypress_timeout} seconds and the tests were not verified",
+                    "test_file_paths": list(file_paths.values()),
+                    "cypress_timed_out": True
+                })
+
+            # Ask the LLM to fix each failing test
+            fixed_file_paths = []
+            warning = None
+            if _cypress_failed(out, err):
+                cypress_output = _cypress_output(out, err)
+                failed, unattributed = _failed_specs(cypress_output, filenames)
+                fixed_codes = await asyncio.gather(*(_fix_cypress_code(llm, codes[filename], cypress_output) for filename in failed))
+                await asyncio.gather(*(asyncio.to_thread(_write_text, file_paths[filename], fixed_code) for filename, fixed_code in zip(failed, fixed_codes)))
+                fixed_file_paths = [file_paths[filename] for filename in failed]
+                if unattributed:
+                    # Leave specs whose result is unknown untouched rather than rewriting ones that passed
+                    logger.warning("Cypress reported failures that could not be tied to a generated spec")
+                    warning = "Cypress reported failures that could not be tied to a specific test file; those files were left unchanged"
+
+            result = {
+                "result": f"{len(filenames)} test cases generated",
+                "test_file_paths": list(file_paths.values())
+            }
+            if fixed_file_paths:
+                result["fixed_test_file_paths"] = fixed_file_paths
+            if warning:
+                result["warning"] = warning
+            return _dumps(result)
+        except Exception as e:
+            tb = traceback.format_exc()
+            logger.error(f"Failed to generate Cypress code: {e}\n{tb}")
+            return _dumps({"error": f"{type(e).__name__}: {str(e)}", "traceback": tb})
+
+    yield FunctionInfo.from_fn(
+        generate_test_automation_code_batch,
+        description="Generates Cypress JS test automation code for several test cases and runs them together. Input: JSON with 'test_cases', a list of objects with 'test_case', 'start_page_url' and 'relevant_html_content_to_test'. Output: Paths to the generated test files."
+    )
+
+_TEST_PLAN_SYSTEM = """You are an expert QA engineer. Write the content of a comprehensive test plan for the application and test cases given by the user.
+
+Respond with a single JSON object and nothing else, using exactly these keys:
+- "introduction": markdown paragraph(s) introducing the test plan
+- "objectives": markdown list of the test objectives
+- "environment": markdown list of browsers, devices and tools for the test environment
+- "test_cases": a list with one object per test case, each with the keys "id", "description", "prerequisites", "steps" (a list of strings), "expected_results" and "priority" ("High", "Medium" or "Low")
+- "schedule": markdown describing the test schedule
+- "risks": markdown list of risks and their mitigations
+- "exit_criteria": markdown list of exit criteria
+
+Requirements:
+- Include emoticons in the markdown values to improve readability and visual appeal (e.g., ✅ for pass criteria, 🔍 for test steps, ⚠️ for risks, etc.)
+- Do not include section headers; they are added automatically
+- Cover every test case given by the user"""
+
+# Fixed layout of the generated test plan; only the section bodies come from the LLM
+_TEST_PLAN_SKELETON = """# 🧪 {test_name}
+
+🌐 **Application URL:** {application_url}
+📅 **Date:** {date}
+
+## 📝 1. Introduction
+
+{introduction}
+
+## 🎯 2. Test Objectives
+
+{objectives}
+
+## 💻 3. Test Environment
+
+{environment}
+
+## ✅ 4. Test Cases
+
+{test_cases}
+
+## 📅 5. Test Schedule
+
+{schedule}
+
+## ⚠️ 6. Risk Assessment
+
+{risks}
+
+## 🏁 7. Exit Criteria
+
+{exit_criteria}
+"""
+
+_PRIORITY_EMOTICONS = {"high": "🔴", "medium": "🟠", "low": "🟢"}
+
+def _as_markdown(value) -> str:
+    if isinstance(value, list):
+        return "\n".join(f"- {item}" for item in value)
+    return str(value).strip() if value else "_Not provided._"
+
+def _as_inline_markdown(value) -> str:
+    # For values placed after a field label, where a bullet list would break the layout
+    if isinstance(value, list):
+        return "; ".join(str(item).strip() for item in value) or "_Not provided._"
+    return _as_markdown(value)
+
+def _render_test_case(index: int, test_case) -> str:
+    if not isinstance(test_case, dict):
+        return f"### 🔍 TC-{index:03d}: {test_case}"
+    steps = test_case.get("steps") or []
+    if isinstance(steps, str):
+        steps = [steps]
+    priority = str(test_case.get("priority", "Medium"))
+    lines = [
+        f"### 🔍 {test_case.get('id') or f'TC-{index:03d}'}: {test_case.get('description', '')}",
+        "",
+        f"- **Prerequisites:** {_as_inline_markdown(test_case.get('prerequisites'))}",
+        f"- **Priority:** {_PRIORITY_EMOTICONS.get(priority.lower(), '⚪')} {priority}",
+        "",
+        "**Test Steps:**",
+        "",
+        *(f"{number}. 👉 {step}" for number, step in enumerate(steps, 1)),
+        "",
+        f"**Expected Results:** ✅ {_as_inline_markdown(test_case.get('expected_results'))}",
+    ]
+    return "\n".join(lines)
+
+def _render_test_plan(sections: dict, test_name: str, application_url: str, date: str) -> str:
+    test_cases = sections.get("test_cases") or []
+    if not isinstance(test_cases, list):
+        test_cases = [test_cases]
+    return _TEST_PLAN_SKELETON.format(
+        test_name=test_name,
+        application_url=application_url,
+        date=date,
+        introduction=_as_markdown(sections.get("introduction")),
+        objectives=_as_markdown(sections.get("objectives")),
+        environment=_as_markdown(sections.get("environment")),
+        test_cases="\n\n".join(_render_test_case(index, test_case) for index, test_case in enumerate(test_cases, 1)) or "_Not provided._",
+        schedule=_as_markdown(sections.get("schedule")),
+        risks=_as_markdown(sections.get("risks")),
+        exit_criteria=_as_markdown(sections.get("exit_criteria"))
+    )
+
 class GenerateTestPlanMarkdownConfig(FunctionBaseConfig, name="generate_test_plan_markdown"):
     description: str
     llm_name: str = "openai_llm"  # Default to OpenAI LLM
@@ -263,9 +822,12 @@ async def generate_test_plan_markdown_tool(config: GenerateTestPlanMarkdownConfi
     Input: A JSON with test_name, application_url, and test_cases fields
     Output: Path to the created markdown file
     """
-    from langchain_core.messages import HumanMessage
     import datetime
 
+    llm = await _get_llm(builder, config.llm_name)
+    if not llm:
+        raise RuntimeError(f"Unable to access LLM '{config.llm_name}' for test plan generation")
+
     async def generate_test_plan_markdown(query: str) -> str:
         try:
             # Robust input parsing
@@ -273,96 +835,62 @@ async def generate_test_plan_markdown_tool(config: GenerateTestPlanMarkdownConfi
             if isinstance(query, str):
                 try:
                     # First, try to parse the string as JSON
-                    parsed = json.loads(query.replace("'", '"'))
+                    parsed = _parse_loose(query)
                     # If 'query' key exists, handle its value
                     if isinstance(parsed, dict) and 'query' in parsed:
                         inner_query = parsed['query']
                         if isinstance(inner_query, dict):
                             data = inner_query
                         elif isinstance(inner_query, str):
-                            try:
-                                data = json.loads(inner_query.replace("'", '"'))
-                            except Exception:
-                                # Try to eval as Python dict if JSON fails (last resort)
-                                import ast
-                                data = ast.literal_eval(inner_query)
+                            data = _parse_loose(inner_query)
                         else:
                             data = parsed
                     else:
                         data = parsed
                 except Exception as parse_error:
                     logger.error(f"JSON parsing error: {str(parse_error)}")
-                    return json.dumps({"error": "Input must be a JSON string with 'test_name', 'application_url', and 'test_cases' fields, or a 'query' key containing such a JSON object."})
+                    return _dumps({"error": "Input must be a JSON string with 'test_name', 'application_url', and 'test_cases' fields, or a 'query' key containing such a JSON object."})
             elif isinstance(query, dict):
                 data = query
             else:
-                return json.dumps({"error": "Input must be a JSON string or dict."})
+                return _dumps({"error": "Input must be a JSON string or dict."})
 
             if not isinstance(data, dict):
-                return json.dumps({"error": "Parsed input is not a dictionary."})
+                return _dumps({"error": "Parsed input is not a dictionary."})
 
             test_name = data.get("test_name", "Untitled Test Plan")
             application_url = data.get("application_url", "")
             test_cases = data.get("test_cases", [])
 
             if not test_cases:
-                return json.dumps({"error": "At least one test case must be provided."})
-
-            # Get the LLM to generate the test plan
-            llm = await builder.get_llm(config.llm_name, wrapper_type=LLMFrameworkEnum.LANGCHAIN)
-            if not llm:
-                return json.dumps({"error": "Unable to access LLM for test plan generation."})
+                return _dumps({"error": "At least one test case must be provided."})
 
-            # Create prompt for generating a test plan with emoticons
-            prompt = f"""
-            You are an expert QA engineer. Create a comprehensive test plan in markdown format for the following application and test cases.
-            
-            Test Plan Name: {test_name}
-            Application URL: {application_url}
-            Test Cases: {test_cases}
-            
-            Requirements:
-            - Format as a proper markdown document with headers, lists, and tables where appropriate
-            - Include emoticons to improve readability and visual appeal (e.g., ✅ for pass criteria, 🔍 for test steps, etc.)
-            - Include the following sections:
-              1. Introduction (with emoticons like 📝, 🎯)
-              2. Test Objectives (with emoticons like 🎯, 🚀)
-              3. Test Environment (with emoticons like 💻, 🌐, 📱)
-              4. Test Cases (with emoticons like ✅, ❌, 🔍)
-              5. Test Schedule (with emoticons like 📅, ⏱️)
-              6. Risk Assessment (with emoticons like ⚠️, 🛑)
-              7. Exit Criteria (with emoticons like 🏁, 🎖️)
-            - For each test case, include:
-              * Test ID
-              * Test Description
-              * Prerequisites
-              * Test Steps with emoticons
-              * Expected Results
-              * Priority (with appropriate emoticon)
-            - Only output valid markdown content (no extra explanations)
-            - Be creative with emoticon usage to make the document visually appealing and easy to scan
-            """
-            
-            response = llm.invoke([HumanMessage(content=prompt)])
-            markdown_content = response.content.strip()
-            
-            # Save markdown to output folder
-            output_dir = os.path.join(os.path.dirname(__file__), '../../output')
-            os.makedirs(output_dir, exist_ok=True)
+            # Ask the LLM only for the section bodies; the markdown layout is fixed
+            prompt = (
+                f"Test Plan Name: {test_name}\n"
+                f"Application URL: {application_url}\n"
+                f"Test Cases: {test_cases}"
+            )
+            content = await _cached_invoke(llm, prompt, system=_TEST_PLAN_SYSTEM)
+            current_date = datetime.datetime.now()
+            try:
+                json_part = _extract_braced(content)
+                sections = _parse_loose(json_part if json_part is not None else content)
+                if not isinstance(sections, dict):
+                    raise ValueError("Test plan content is not a JSON object")
+                markdown_content = _render_test_plan(sections, test_name, application_url, current_date.strftime("%Y-%m-%d"))
+            except ValueError as e:
+                # Keep the LLM output rather than failing the whole tool call
+                logger.warning(f"Unable to parse test plan sections, saving raw response: {e}")
+                markdown_content = content.strip()
             
-            # Create a filename from the test name
-            def slugify(text):
-                text = re.sub(r'[^a-zA-Z0-9]+', '_', text)
-                return text.strip('_').lower()
-                
-            current_date = datetime.datetime.now().strftime("%Y%m%d")
-            filename = f"{current_date}_{slugify(test_name)}.md"
-            file_path = os.path.abspath(os.path.join(output_dir, filename))
+            # Save markdown to output folder, creating a filename from the test name
+            filename = f"{current_date.strftime('%Y%m%d')}_{_slugify(test_name)}.md"
+            file_path = os.path.join(_OUTPUT_DIR, filename)
             
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
+            await asyncio.to_thread(_write_text, file_path, markdown_content)
                 
-            return json.dumps({
+            return _dumps({
                 "result": "Test plan markdown generated successfully",
                 "file_path": file_path
             })
@@ -370,7 +898,7 @@ async def generate_test_plan_markdown_tool(config: GenerateTestPlanMarkdownConfi
         except Exception as e:
             tb = traceback.format_exc()
             logger.error(f"Failed to generate test plan markdown: {e}\n{tb}")
-            return json.dumps({"error": f"{type(e).__name__}: {str(e)}", "traceback": tb})
+            return _dumps({"error": f"{type(e).__name__}: {str(e)}", "traceback": tb})
     
     yield FunctionInfo.from_fn(
         generate_test_plan_markdown,